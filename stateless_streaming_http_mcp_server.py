@@ -1,6 +1,8 @@
 # Based on https://github.com/modelcontextprotocol/python-sdk/blob/09e3a05e13211d1081efcdc9a962affb02e40c05/examples/servers/simple-streamablehttp-stateless/mcp_simple_streamablehttp_stateless/server.py
 
+import asyncio
 import contextlib
+import sys
 from collections.abc import AsyncIterator
 from typing import Any, Dict
 
@@ -9,113 +11,112 @@ from mcp.server.lowlevel import Server
 from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
 from starlette.applications import Starlette
 from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 from starlette.routing import Mount, Route
-from starlette.responses import JSONResponse
+from starlette.responses import Response
 from starlette.types import Receive, Scope, Send
 from starlette.requests import Request
-import requests 
-import json
+import httpx
+import orjson
 import uvicorn
 
-from util.vars import (API_BASE_URL, API_TOKEN_PREFIX, AUTH_HEADER_NAME, 
-                       OPENAPI_SPEC_URL, MCP_SERVER_NAME, HTTP_MCP_SERVER_PORT)
-from util.shared import OpenAPISpec
+from util.vars import (API_BASE_URL, API_TOKEN_PREFIX, AUTH_HEADER_NAME,
+                       OPENAPI_SPEC_URL, MCP_SERVER_NAME, HTTP_MCP_SERVER_PORT,
+                       SPEC_REFRESH_SECS)
+from util.shared import OpenAPISpec, ToolSpec, dispatch_tool
 from util.log import logger
 
+# Shared empty result for the handlers that never return anything
+EMPTY_LIST: list = []
+
 def prepare_auth_headers(headers: Dict):
-    new_headers = {}
-    # Forward Authorization header if present. Change the 
-    auth_header = headers.get("authorization")
-    if auth_header:
-        vals = auth_header.strip().split(" ")
-        if len(vals) == 2 and API_TOKEN_PREFIX:
+    # Forward Authorization header if present. Change the
+    api_val = headers.get("authorization")
+    if api_val:
+        # partition avoids the list allocation of split; only rewrite the
+        # scheme when the value is exactly "<scheme> <token>"
+        _scheme, sep, token = api_val.strip().partition(" ")
+        if sep and API_TOKEN_PREFIX and " " not in token:
             # perhaps need to change 'Bearer' to another term
-            api_val = f"{API_TOKEN_PREFIX} {vals[1]}"
-        else:
-            api_val = auth_header
-        new_headers[AUTH_HEADER_NAME] = api_val
-
-    # Forward Cookie header if present
-    cookie_header = headers.get("cookie")
-    if cookie_header:
-        new_headers["Cookie"] = cookie_header
-    
-    return new_headers
+            api_val = f"{API_TOKEN_PREFIX} {token}"
 
-def generate_mcp_discovery_document(openapi_spec: OpenAPISpec) -> dict:
-    """Generate the .well-known/mcp.json discovery document"""
-    
-    # Build security schemes from your authentication setup
-    security_schemes = {}
-    security_requirements = []
-    
-    if AUTH_HEADER_NAME:
-        security_schemes["apiToken"] = {
-            "type": "http",
-            "scheme": "bearer",
-            "description": f"API token authentication using {AUTH_HEADER_NAME} header with {API_TOKEN_PREFIX} prefix"
+    # Single dict build, forwarding Cookie as well when present
+    return {
+        k: v
+        for k, v in ((AUTH_HEADER_NAME, api_val), ("Cookie", headers.get("cookie")))
+        if v
+    }
+
+# Static pieces of the discovery document. These depend only on env config,
+# so they are built once at import rather than per manifest generation.
+DEFAULT_TOOL_RESPONSES = {
+    "200": {
+        "description": "Successful response",
+        "content": {
+            "application/json": {
+                "schema": {
+                    "type": "object",
+                    "description": "API response data"
+                }
+            },
+            "text/plain": {
+                "schema": {
+                    "type": "string",
+                    "description": "Plain text response"
+                }
+            }
         }
-        security_requirements.append({"apiToken": []})
-    
-    # Add cookie auth if you're handling cookies
-    security_schemes["cookieAuth"] = {
+    },
+    "error": {
+        "description": "Error response",
+        "content": {
+            "text/plain": {
+                "schema": {
+                    "type": "string",
+                    "description": "Error message"
+                }
+            }
+        }
+    }
+}
+
+SECURITY_SCHEMES = {
+    # Cookie auth is always offered since the server forwards cookies
+    "cookieAuth": {
         "type": "apiKey",
         "in": "cookie",
         "name": "session",
         "description": "Cookie-based authentication"
     }
-    
-    # Build enhanced tools with response schemas
-    enhanced_tools = []
-    for tool_info in openapi_spec.tools_cache.values():
-        tool_def = {
-            "name": tool_info["name"],
-            "description": tool_info["description"],
-            "inputSchema": tool_info["inputSchema"]
-        }
-        
-        # Add response schema if available from OpenAPI spec
-        if "responses" in tool_info:
-            tool_def["responses"] = tool_info["responses"]
-        else:
-            # Default response schema based on your implementation
-            tool_def["responses"] = {
-                "200": {
-                    "description": "Successful response",
-                    "content": {
-                        "application/json": {
-                            "schema": {
-                                "type": "object",
-                                "description": "API response data"
-                            }
-                        },
-                        "text/plain": {
-                            "schema": {
-                                "type": "string",
-                                "description": "Plain text response"
-                            }
-                        }
-                    }
-                },
-                "error": {
-                    "description": "Error response",
-                    "content": {
-                        "text/plain": {
-                            "schema": {
-                                "type": "string",
-                                "description": "Error message"
-                            }
-                        }
-                    }
-                }
-            }
-        
-        # Add security requirements for this tool
-        if security_requirements:
-            tool_def["security"] = security_requirements
-            
-        enhanced_tools.append(tool_def)
-    
+}
+SECURITY_REQUIREMENTS = []
+if AUTH_HEADER_NAME:
+    SECURITY_SCHEMES["apiToken"] = {
+        "type": "http",
+        "scheme": "bearer",
+        "description": f"API token authentication using {AUTH_HEADER_NAME} header with {API_TOKEN_PREFIX} prefix"
+    }
+    SECURITY_REQUIREMENTS.append({"apiToken": []})
+
+def build_manifest_tool_def(tool_info: ToolSpec) -> dict:
+    """Build the manifest entry for one cached tool"""
+    tool_def = {
+        "name": tool_info.name,
+        "description": tool_info.description,
+        "inputSchema": tool_info.input_schema,
+        "responses": tool_info.responses or DEFAULT_TOOL_RESPONSES,
+    }
+    if SECURITY_REQUIREMENTS:
+        tool_def["security"] = SECURITY_REQUIREMENTS
+    return tool_def
+
+def generate_mcp_discovery_document(openapi_spec: OpenAPISpec) -> dict:
+    """Generate the .well-known/mcp.json discovery document"""
+    enhanced_tools = [
+        build_manifest_tool_def(tool_info)
+        for tool_info in openapi_spec.tools_cache.values()
+    ]
+
     discovery_doc = {
         "mcpVersion": "2024-11-05",
         "server": {
@@ -144,31 +145,29 @@ def generate_mcp_discovery_document(openapi_spec: OpenAPISpec) -> dict:
     }
     
     # Add security information
-    if security_schemes:
+    if SECURITY_SCHEMES:
         discovery_doc["components"] = {
-            "securitySchemes": security_schemes
+            "securitySchemes": SECURITY_SCHEMES
         }
-        discovery_doc["security"] = security_requirements
-    
+        discovery_doc["security"] = SECURITY_REQUIREMENTS
+
     # Add transport information
     discovery_doc["transport"] = {
         "type": "http",
         "baseUrl": f"{API_BASE_URL}/mcp",
         "authentication": {
-            "required": bool(security_requirements),
-            "methods": list(security_schemes.keys()) if security_schemes else []
+            "required": bool(SECURITY_REQUIREMENTS),
+            "methods": list(SECURITY_SCHEMES.keys()) if SECURITY_SCHEMES else []
         }
     }
     
     return discovery_doc
 
-async def well_known_mcp_handler(request: Request) -> JSONResponse:
+async def well_known_mcp_handler(request: Request) -> Response:
     """Handle requests to /.well-known/mcp.json"""
-    # You'll need to pass the openapi_spec to this handler
-    # One way is to store it in the app state
-    openapi_spec = request.app.state.openapi_spec
-    discovery_doc = generate_mcp_discovery_document(openapi_spec)
-    return JSONResponse(content=discovery_doc)
+    # The manifest is immutable once the spec is loaded, so it is serialized
+    # once at startup and served as raw bytes here
+    return Response(content=request.app.state.manifest_bytes, media_type="application/json")
 
 def main(
     openapi_spec: OpenAPISpec,
@@ -176,17 +175,32 @@ def main(
 ) -> int:
     app = Server(MCP_SERVER_NAME)
 
-    @app.list_resources()
-    async def list_resources() -> list[types.Resource]:
-        return [
-            types.Resource(
-                uri=OPENAPI_SPEC_URL,
-                name="API Schema",
-                description="OpenAPI specification for available endpoints",
-                mimeType="application/json"
+    # Shared upstream client, created in lifespan so it lives on the event loop
+    http_client: httpx.AsyncClient | None = None
+
+    # tools_cache is frozen after startup, so the MCP objects handed back by
+    # the list_* handlers can be built once instead of per request
+    tool_objects = [
+        types.Tool(
+            name=tool_info.name,
+            description=tool_info.description,
+            inputSchema=tool_info.input_schema
+        )
+        for tool_info in openapi_spec.tools_cache.values()
+    ]
+    resource_objects = [
+        types.Resource(
+            uri=OPENAPI_SPEC_URL,
+            name="API Schema",
+            description="OpenAPI specification for available endpoints",
+            mimeType="application/json"
         )
     ]
 
+    @app.list_resources()
+    async def list_resources() -> list[types.Resource]:
+        return resource_objects
+
     @app.read_resource()
     async def read_resource(uri: str) -> str:
         logger.info(f"Reading resource: {uri}")
@@ -196,96 +210,84 @@ def main(
     
     @app.list_tools()
     async def list_tools() -> list[types.Tool]:
-        return [
-            types.Tool(
-                name=tool_info["name"],
-                description=tool_info["description"],
-                inputSchema=tool_info["inputSchema"]
-            )
-            for tool_info in openapi_spec.tools_cache.values()
-        ]
+        return tool_objects
 
     @app.call_tool()
     async def call_tool(tool_name: str, arguments: dict[str, Any]) -> list[types.ContentBlock]:
         tool_data = openapi_spec.tools_cache[tool_name]
 
-        endpoint = tool_data["endpoint"]
-        params = arguments.copy()
-
-        # Replace path params in URL (e.g. {id})
-        for key, value in list(params.items()):
-            placeholder = "{" + key + "}"
-            if placeholder in endpoint:
-                endpoint = endpoint.replace(placeholder, str(value))
-                del params[key]
-
-        url = API_BASE_URL.rstrip("/") + endpoint
-
+        # Forward the caller's auth per request; everything else lives in the
+        # shared dispatch helper
         request = app.request_context.request
         headers = prepare_auth_headers(request.headers)
+        return await dispatch_tool(http_client, tool_data, tool_name, arguments, headers=headers)
 
-        logger.info(f"Making {tool_data['method']} request to {url}")
-
-        try:
-            if tool_data["method"].upper() == "GET":
-                resp = requests.get(url, params=params, headers=headers, timeout=30)
-            elif tool_data["method"].upper() == "POST":
-                resp = requests.post(url, json=params, headers=headers, timeout=30)
-            else:
-                return [types.TextContent(type="text", text=f"Unsupported method: {tool_data['method']}")]
-
-            resp.raise_for_status()
-            try:
-                result_json = resp.json()
-                success_msg = f"Successfully called {tool_name}. Response: {json.dumps(result_json, indent=2)}"
-                logger.info(f"Tool '{tool_name}' executed successfully")
-                return [types.TextContent(type="text", text=success_msg)]
-            except json.JSONDecodeError:
-                logger.info(f"Tool '{tool_name}' returned non-JSON response")
-                return [types.TextContent(type="text", text=f"Response from {tool_name}: {resp.text}")]
-
-        except requests.exceptions.Timeout:
-            error_msg = f"Request to {tool_name} timed out after 30 seconds"
-            logger.error(error_msg)
-            return [types.TextContent(type="text", text=error_msg)]
-        except requests.exceptions.RequestException as e:
-            error_msg = f"API request failed: {str(e)}"
-            logger.error(error_msg)
-            return [types.TextContent(type="text", text=error_msg)]
-        except Exception as e:
-            error_msg = f"Error executing tool '{tool_name}': {str(e)}"
-            logger.error(error_msg)
-            return [types.TextContent(type="text", text=error_msg)]    
 
-    
     @app.list_resource_templates()
     async def list_resource_templates() -> list[types.ResourceTemplate]:
-        return []
+        return EMPTY_LIST
 
     @app.list_prompts()
     async def list_prompts() -> list[types.Prompt]:
-        return []
+        return EMPTY_LIST
 
     # Create the session manager with true stateless mode
     session_manager = StreamableHTTPSessionManager(
         app=app,
         event_store=None,
-#        json_response=json_response, # Leaving default for this example
         stateless=True,
     )
 
     async def handle_streamable_http(scope: Scope, receive: Receive, send: Send) -> None:
         await session_manager.handle_request(scope, receive, send)
 
+    async def refresh_spec_forever(starlette_app: Starlette) -> None:
+        """Periodically re-fetch the spec and swap in the derived state.
+
+        The conditional fetch in OpenAPISpec makes an unchanged spec cost a
+        single 304 round trip; only a changed spec triggers a rebuild. The
+        tool list is mutated in place so existing handler closures see the
+        new tools, and the manifest bytes are replaced atomically.
+        """
+        while True:
+            await asyncio.sleep(SPEC_REFRESH_SECS)
+            changed = await asyncio.to_thread(openapi_spec.refresh)
+            if not changed:
+                continue
+            tool_objects[:] = [
+                types.Tool(
+                    name=tool_info.name,
+                    description=tool_info.description,
+                    inputSchema=tool_info.input_schema
+                )
+                for tool_info in openapi_spec.tools_cache.values()
+            ]
+            starlette_app.state.manifest_bytes = orjson.dumps(
+                generate_mcp_discovery_document(openapi_spec)
+            )
+            logger.info(f"Spec changed; now serving {len(tool_objects)} tools")
+
     @contextlib.asynccontextmanager
     async def lifespan(app: Starlette) -> AsyncIterator[None]:
-        """Context manager for session manager."""
+        """Context manager for session manager and the shared upstream client."""
+        nonlocal http_client
+        http_client = httpx.AsyncClient(
+            http2=True,
+            timeout=30,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        )
+        refresh_task = (
+            asyncio.create_task(refresh_spec_forever(app)) if SPEC_REFRESH_SECS > 0 else None
+        )
         async with session_manager.run():
             logger.info("Application started with StreamableHTTP session manager!")
             try:
                 yield
             finally:
                 logger.info("Application shutting down...")
+                if refresh_task:
+                    refresh_task.cancel()
+                await http_client.aclose()
 
     # Create an ASGI application using the transport
     starlette_app = Starlette(
@@ -297,8 +299,14 @@ def main(
         lifespan=lifespan,
     )
 
-    # Store the openapi_spec in app state so the discovery handler can access it
+    # Store the openapi_spec and the pre-serialized discovery document in app
+    # state so the discovery handler can serve cached bytes
     starlette_app.state.openapi_spec = openapi_spec
+    starlette_app.state.manifest_bytes = orjson.dumps(generate_mcp_discovery_document(openapi_spec))
+
+    # Compress manifest and tool responses over ~1KB; worthwhile for the
+    # OpenAPI-derived JSON payloads this server shuttles around
+    starlette_app = GZipMiddleware(starlette_app, minimum_size=1024, compresslevel=5)
 
     # Wrap ASGI application with CORS middleware to expose Mcp-Session-Id header
     # for browser-based clients (ensures 500 errors get proper CORS headers)
@@ -309,7 +317,10 @@ def main(
         expose_headers=["Mcp-Session-Id"],
     )
 
-    uvicorn.run(starlette_app, host="127.0.0.1", port=port)
+    # uvloop + httptools give a C-level event loop and HTTP parser;
+    # uvloop is unavailable on Windows, so fall back to asyncio there
+    loop = "uvloop" if sys.platform != "win32" else "asyncio"
+    uvicorn.run(starlette_app, host="127.0.0.1", port=port, loop=loop, http="httptools")
 
     return 0
 
@@ -1,12 +1,12 @@
 import asyncio
-import requests
+import sys
+import httpx
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent, Resource, Prompt
-import json
-from util.shared import OpenAPISpec
+from util.shared import OpenAPISpec, dispatch_tool
 from util.log import logger
-from util.vars import MCP_SERVER_NAME, OPENAPI_SPEC_URL, AUTH_HEADER, API_BASE_URL
+from util.vars import MCP_SERVER_NAME, OPENAPI_SPEC_URL, AUTH_HEADER
 
 
 # Create MCP server
@@ -15,22 +15,30 @@ server = Server(MCP_SERVER_NAME)
 openapi_spec = OpenAPISpec()
 logger.info("Loaded openapi spec")
 
+# Constant headers for every upstream call, merged once at import
+REQUEST_HEADERS = {'Content-Type': 'application/json', **AUTH_HEADER}
+
+# Shared upstream client; created in main() once the event loop exists
+http_client: httpx.AsyncClient | None = None
+
+# The tool list is immutable once the spec is loaded, so build it (and log
+# each tool) once instead of on every tools/list request
+TOOL_OBJECTS = [
+    Tool(
+        name=tool_info.name,
+        description=tool_info.description,
+        inputSchema=tool_info.input_schema
+    )
+    for tool_info in openapi_spec.tools_cache.values()
+]
+for _tool in TOOL_OBJECTS:
+    logger.debug(f"Added {_tool.name}")
+logger.info(f"Prepared {len(TOOL_OBJECTS)} tools")
+
 @server.list_tools()
 async def list_tools() -> list[Tool]:
     """Return list of available tools"""
-    tools = []
-    for tool_info in openapi_spec.tools_cache.values():
-        tool_name = tool_info["name"]
-        logger.info(tool_name)
-        tools.append(Tool(
-            name=tool_name,
-            description=tool_info["description"],
-            inputSchema=tool_info["inputSchema"]
-        ))
-        logger.info(f"Added {tool_name}")
-    
-    logger.info(f"Listed {len(tools)} tools")
-    return tools
+    return TOOL_OBJECTS
 
 @server.list_prompts()
 async def list_prompts() -> list[Prompt]:
@@ -48,92 +56,57 @@ async def list_resources() -> list[Resource]:
             description="OpenAPI specification for available endpoints",
             mimeType="application/json"
         ),
-        # Static documentation, public configs, etc.
     ]
 
+# Dict dispatch keeps resource lookup O(1) and easy to extend
+_RESOURCE_READERS = {
+    OPENAPI_SPEC_URL: lambda: openapi_spec.raw_openapi_spec,
+}
+
 @server.read_resource()
 async def read_resource(uri: str) -> str:
     """Read and return resource content"""
     logger.info(f"Reading resource: {uri}")
-    
-    if str(uri) == OPENAPI_SPEC_URL:
-        return openapi_spec.raw_openapi_spec
-    else:
-        error_msg = f"Unknown resource URI: {uri}"
-        logger.error(error_msg)
-        raise ValueError(error_msg)
+
+    reader = _RESOURCE_READERS.get(str(uri))
+    if reader:
+        return reader()
+    error_msg = f"Unknown resource URI: {uri}"
+    logger.error(error_msg)
+    raise ValueError(error_msg)
 
 @server.call_tool()
 async def call_tool(name: str, arguments: dict) -> list[TextContent]:
     """Execute a tool call"""
-    logger.info(f"Calling tool '{name}' with arguments: {arguments}")
-    
+    logger.debug("Calling tool %s with arguments %s", name, arguments)
+
     tool = openapi_spec.tools_cache.get(name)
     if not tool:
         error_msg = f"Tool '{name}' not found. Available tools: {list(openapi_spec.tools_cache.keys())}"
         logger.error(error_msg)
         return [TextContent(type="text", text=error_msg)]
 
-    try:
-        endpoint = tool["endpoint"]
-        params = arguments.copy()
-
-        # Replace path params in URL
-        for key, value in list(params.items()):
-            placeholder = "{" + key + "}"
-            if placeholder in endpoint:
-                endpoint = endpoint.replace(placeholder, str(value))
-                del params[key]
-
-        url = API_BASE_URL.rstrip("/") + endpoint
-        logger.info(f"Making {tool['method']} request to {url}")
-
-        # Prepare headers with authentication
-        headers = {'Content-Type': 'application/json'} | AUTH_HEADER
-        # Make the API call
-        if tool["method"] == "GET":
-            resp = requests.get(url, params=params, headers=headers, timeout=30)
-        elif tool["method"] == "POST":
-            resp = requests.post(url, json=params, headers=headers, timeout=30)
-        else:
-            error_msg = f"Unsupported method: {tool['method']}"
-            logger.error(error_msg)
-            return [TextContent(type="text", text=error_msg)]
-
-        resp.raise_for_status()
-        
-        # Return the response
-        try:
-            result = resp.json()
-            success_msg = f"Successfully called {name}. Response: {json.dumps(result, indent=2)}"
-            logger.info(f"Tool '{name}' executed successfully")
-            return [TextContent(type="text", text=success_msg)]
-        except json.JSONDecodeError:
-            logger.info(f"Tool '{name}' returned non-JSON response")
-            return [TextContent(type="text", text=f"Response from {name}: {resp.text}")]
-            
-    except requests.exceptions.Timeout:
-        error_msg = f"Request to {name} timed out after 30 seconds"
-        logger.error(error_msg)
-        return [TextContent(type="text", text=error_msg)]
-    except requests.exceptions.RequestException as e:
-        error_msg = f"API request failed: {str(e)}"
-        logger.error(error_msg)
-        return [TextContent(type="text", text=error_msg)]
-    except Exception as e:
-        error_msg = f"Error executing tool '{name}': {str(e)}"
-        logger.error(error_msg)
-        return [TextContent(type="text", text=error_msg)]
+    # Auth and content-type headers are set on the client itself
+    return await dispatch_tool(http_client, tool, name, arguments)
 
 async def main():
     """Main entry point"""
-    
+    global http_client
+
     logger.info("MCP server ready and waiting for connections...")
-    
-    # Run the server
-    async with stdio_server() as (read_stream, write_stream):
-        logger.info("Connected to client via stdio")
-        await server.run(read_stream, write_stream, server.create_initialization_options())
+
+    # Run the server with a pooled upstream client for the lifetime of the session
+    # Explicit pool sizing: enough keep-alive sockets for bursts of tool
+    # calls against one backend without over-opening connections to it
+    limits = httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60)
+    async with httpx.AsyncClient(headers=REQUEST_HEADERS, timeout=30, limits=limits) as http_client:
+        async with stdio_server() as (read_stream, write_stream):
+            logger.info("Connected to client via stdio")
+            await server.run(read_stream, write_stream, server.create_initialization_options())
 
 if __name__ == "__main__":
+    if sys.platform != "win32":
+        # uvloop speeds up every read/write and task switch on the loop
+        import uvloop
+        uvloop.install()
     asyncio.run(main())
\ No newline at end of file
@@ -1,4 +1,16 @@
+import atexit
 import logging
+import logging.handlers
+import queue
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger("auto-mcp-server")
\ No newline at end of file
+# Route log records through a queue so request-path logging is a cheap
+# enqueue; a background thread does the actual stderr writes
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_listener = logging.handlers.QueueListener(
+    _log_queue, logging.StreamHandler(), respect_handler_level=True
+)
+_listener.start()
+atexit.register(_listener.stop)
+
+logging.basicConfig(level=logging.INFO, handlers=[logging.handlers.QueueHandler(_log_queue)])
+logger = logging.getLogger("auto-mcp-server")
@@ -1,23 +1,246 @@
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
+from dataclasses import dataclass
+import hashlib
+import os
+import re
+import sys
+import tempfile
+import httpx
+import orjson
 import requests
-from util.vars import OPENAPI_SPEC_URL, AUTH_HEADER
+from mcp.types import TextContent
+from requests.adapters import HTTPAdapter, Retry
+from util.vars import OPENAPI_SPEC_URL, AUTH_HEADER, API_BASE_URL
 from util.log import logger
 from abc import ABC
 
+# Shared session for the synchronous paths so repeated calls to the same
+# host reuse pooled keep-alive connections instead of re-handshaking
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=50,
+    max_retries=Retry(total=2, backoff_factor=0.1),
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
+# Matches {param} placeholders in OpenAPI path templates
+_PATH_PARAM_RE = re.compile(r"\{([^}]+)\}")
+
+# Single-pass cleanup of a URL path into a tool-name fragment
+_NAME_TRANS = str.maketrans({"/": "_", "{": None, "}": None})
+
+# Schema keys copied verbatim from a schema node to its processed form
+_SCHEMA_COPY_KEYS = (
+    "description", "format", "enum",
+    "minimum", "maximum", "minLength", "maxLength", "pattern",
+)
+
+# Canonical interned copies of the JSON Schema type names, so every schema
+# node shares one string object per type and later lookups compare by pointer
+_TYPES = {t: sys.intern(t) for t in (
+    "string", "integer", "number", "boolean", "object", "array", "null",
+)}
+_MISSING = object()
+
+# Base URL normalized once; per-tool URL templates are built from this at
+# spec load so the dispatch path never re-strips or concatenates
+_API_BASE = API_BASE_URL.rstrip("/")
+
+
+@dataclass(slots=True, frozen=True)
+class ToolSpec:
+    """Immutable record for one tool derived from an OpenAPI operation.
+
+    Slots keep each record compact and make field access a C-level load
+    instead of a dict lookup on the dispatch path.
+    """
+    name: str
+    description: str
+    endpoint: str
+    method: str
+    path_params: frozenset
+    url_template: str
+    input_schema: Dict[str, Any]
+    responses: Dict[str, Any]
+    tags: Tuple[str, ...] = ()
+    security: Tuple[Dict[str, Any], ...] = ()
+
+
+def _spec_cache_path() -> str:
+    """Per-URL cache file for the raw spec, used across restarts"""
+    digest = hashlib.sha256(OPENAPI_SPEC_URL.encode()).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"auto_mcp_spec_{digest}.cache")
+
+
+def _read_spec_cache(cache_path: str):
+    """Return (etag, raw_spec_bytes) or None if unusable.
+
+    The cache holds only data - the ETag line followed by the raw spec
+    bytes - so a tampered file in the shared temp directory can at worst
+    fail to parse. Pickle would execute whatever a local attacker
+    pre-created at this predictable path.
+    """
+    try:
+        with open(cache_path, "rb") as f:
+            etag_line, sep, raw = f.read().partition(b"\n")
+        if sep and etag_line and raw:
+            return etag_line.decode(), raw
+    except (OSError, UnicodeDecodeError):
+        pass
+    return None
+
+
+def _write_spec_cache(cache_path: str, etag: str, raw: bytes) -> None:
+    """Best-effort atomic cache write; failures only cost the next warm start"""
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(etag.encode())
+            f.write(b"\n")
+            f.write(raw)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"Could not write spec cache {cache_path}: {e}")
+
+
 class OpenAPISpec(ABC):
     def __init__(self):
         try:
-            logger.info(f"Loading OpenAPI spec from {OPENAPI_SPEC_URL}...")
-            resp = requests.get(OPENAPI_SPEC_URL, headers=AUTH_HEADER, timeout=10)
-            resp.raise_for_status()
-            self.raw_openapi_spec = resp.text
-            self.openapi_spec = resp.json()
-            self.tools_cache = extract_tools_from_openapi(self.openapi_spec)
-            logger.info(f"Loaded OpenAPI spec and cached {len(self.tools_cache)} tools")
+            self._load()
         except Exception as e:
             logger.error(f"Failed to load OpenAPI spec: {e}")
             raise
 
+    @staticmethod
+    def _fetch_spec(headers):
+        """One streamed GET for the spec; (raw_bytes, etag), or (None, None) on 304"""
+        with SESSION.get(OPENAPI_SPEC_URL, headers=headers, timeout=10, stream=True) as resp:
+            if resp.status_code == 304:
+                return None, None
+            resp.raise_for_status()
+            # Stream the body in 64KB chunks into one bytearray; large specs
+            # then peak at one copy of the bytes instead of the extra
+            # _content copy requests makes when reading eagerly
+            buf = bytearray()
+            for chunk in resp.iter_content(64 * 1024):
+                buf.extend(chunk)
+            return bytes(buf), resp.headers.get("ETag")
+
+    def _load(self):
+        logger.info(f"Loading OpenAPI spec from {OPENAPI_SPEC_URL}...")
+        cache_path = _spec_cache_path()
+        cached = _read_spec_cache(cache_path)
+
+        raw = etag = None
+        if cached and cached[0]:
+            # Conditional fetch so an unchanged spec costs a 304 with no body
+            raw, etag = self._fetch_spec(AUTH_HEADER | {"If-None-Match": cached[0]})
+            if raw is None:
+                # Re-parse and re-extract from the cached bytes; cheap with
+                # the memoized resolver, and nothing executable is loaded
+                try:
+                    cached_raw = cached[1]
+                    raw_text = cached_raw.decode()
+                    spec = orjson.loads(cached_raw)
+                    tools = extract_tools_from_openapi(spec)
+                    self._publish(raw_text, spec, tools)
+                    logger.info(f"OpenAPI spec unchanged; rebuilt {len(tools)} tools from cache")
+                    return
+                except Exception as e:
+                    # A cache whose ETag matches upstream but whose body
+                    # won't parse would 304 forever; drop it and fetch fresh
+                    logger.warning(f"Spec cache {cache_path} unusable ({e}); refetching")
+                    try:
+                        os.remove(cache_path)
+                    except OSError:
+                        pass
+                    raw = etag = None
+
+        if raw is None:
+            raw, etag = self._fetch_spec(AUTH_HEADER)
+
+        raw_text = raw.decode()
+        spec = orjson.loads(raw)
+        tools = extract_tools_from_openapi(spec)
+        self._publish(raw_text, spec, tools)
+        logger.info(f"Loaded OpenAPI spec and cached {len(tools)} tools")
+        if etag:
+            _write_spec_cache(cache_path, etag, raw)
+
+    def _publish(self, raw_text: str, spec: Dict[str, Any], tools: Dict[str, ToolSpec]) -> None:
+        """Swap in a fully built spec; called only once decode/parse/extract
+        have all succeeded, so a failed load or refresh never leaves the
+        object half-updated."""
+        self.raw_openapi_spec = raw_text
+        self.openapi_spec = spec
+        self.tools_cache = tools
+
+    def refresh(self) -> bool:
+        """Re-fetch the spec; returns True if it changed.
+
+        A failed refresh keeps serving the previously loaded spec rather
+        than taking the server down mid-flight.
+        """
+        previous = self.raw_openapi_spec
+        try:
+            self._load()
+        except Exception as e:
+            logger.error(f"Spec refresh failed, keeping previous spec: {e}")
+            return False
+        return self.raw_openapi_spec != previous
+
+
+async def dispatch_tool(
+    client: httpx.AsyncClient,
+    tool: ToolSpec,
+    name: str,
+    arguments: Dict[str, Any],
+    headers: Dict[str, str] | None = None,
+) -> list[TextContent]:
+    """Make the upstream API call for one tool invocation.
+
+    Shared by both servers' call_tool handlers; `headers` is for per-request
+    headers (e.g. forwarded auth) on top of whatever the client carries.
+    """
+    try:
+        # Split arguments into path and query/body params in one pass each,
+        # without copying or mutating the caller's dict
+        path_names = tool.path_params
+        path_vals = {k: arguments[k] for k in path_names if k in arguments}
+        params = {k: v for k, v in arguments.items() if k not in path_names} if path_vals else arguments
+        url = tool.url_template.format_map(path_vals) if path_vals else tool.url_template
+        logger.debug("Making %s request to %s", tool.method, url)
+
+        # Methods with a request body send the params as JSON, the rest as
+        # query string; one client.request call replaces the per-method branch
+        kwargs = {"json": params} if tool.method in ("POST", "PUT", "PATCH") else {"params": params}
+        resp = await client.request(tool.method, url, headers=headers, **kwargs)
+
+        resp.raise_for_status()
+
+        # The body is passed through as-is; re-encoding JSON we already have
+        # as text would just double the work
+        if resp.headers.get("content-type", "").startswith("application/json"):
+            logger.debug("Tool %s executed successfully", name)
+            return [TextContent(type="text", text=f"Successfully called {name}. Response: {resp.text}")]
+        logger.debug("Tool %s returned non-JSON response", name)
+        return [TextContent(type="text", text=f"Response from {name}: {resp.text}")]
+
+    except httpx.TimeoutException:
+        error_msg = f"Request to {name} timed out after 30 seconds"
+        logger.error(error_msg)
+        return [TextContent(type="text", text=error_msg)]
+    except httpx.HTTPError as e:
+        error_msg = f"API request failed: {str(e)}"
+        logger.error(error_msg)
+        return [TextContent(type="text", text=error_msg)]
+    except Exception as e:
+        error_msg = f"Error executing tool '{name}': {str(e)}"
+        logger.error(error_msg)
+        return [TextContent(type="text", text=error_msg)]
+
 
 def resolve_schema_ref(spec: Dict[str, Any], ref: str) -> Dict[str, Any]:
     """Resolve a $ref to its actual schema definition"""
@@ -35,51 +258,89 @@ def resolve_schema_ref(spec: Dict[str, Any], ref: str) -> Dict[str, Any]:
         return {}
 
 
-def process_schema_properties(spec: Dict[str, Any], schema: Dict[str, Any]) -> Dict[str, Any]:
-    """Process schema properties, resolving $ref and extracting descriptions"""
-    if "$ref" in schema:
-        schema = resolve_schema_ref(spec, schema["$ref"])
-    
-    processed = {}
-    
-    # Handle basic type information
-    if "type" in schema:
-        processed["type"] = schema["type"]
-    
-    # Handle description
-    if "description" in schema:
-        processed["description"] = schema["description"]
-    
-    # Handle format (for things like date-time, email, uri)
-    if "format" in schema:
-        processed["format"] = schema["format"]
-    
-    # Handle enum values
-    if "enum" in schema:
-        processed["enum"] = schema["enum"]
-    
-    # Handle array items
-    if schema.get("type") == "array" and "items" in schema:
-        items_schema = schema["items"]
-        if "$ref" in items_schema:
-            items_schema = resolve_schema_ref(spec, items_schema["$ref"])
-        processed["items"] = process_schema_properties(spec, items_schema)
-    
-    # Handle object properties
-    if schema.get("type") == "object" and "properties" in schema:
-        processed["properties"] = {}
-        for prop_name, prop_schema in schema["properties"].items():
-            processed["properties"][prop_name] = process_schema_properties(spec, prop_schema)
-    
-    # Handle additional constraints
-    for constraint in ["minimum", "maximum", "minLength", "maxLength", "pattern"]:
-        if constraint in schema:
-            processed[constraint] = schema[constraint]
-    
-    return processed
+def build_ref_resolver(spec: Dict[str, Any]):
+    """Return a resolve(ref) closure memoized per unique ref string.
+
+    Large specs reuse the same #/components/schemas/... refs many times;
+    caching collapses the repeated spec walks to one per unique ref.
+    """
+    cache: Dict[str, Dict[str, Any]] = {}
+
+    def resolve(ref: str) -> Dict[str, Any]:
+        resolved = cache.get(ref)
+        if resolved is None:
+            resolved = cache[ref] = resolve_schema_ref(spec, ref)
+        return resolved
+
+    return resolve
+
+
+def process_schema_properties(resolve, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Process schema properties, resolving $ref and extracting descriptions.
+
+    Traverses with an explicit work stack instead of recursion: no Python
+    frame per schema node, and deeply nested specs can't hit RecursionError.
 
+    Raises ValueError on cyclic $refs (a schema that references itself,
+    directly or transitively) so callers fail loudly instead of looping.
+    """
+    root: Dict[str, Any] = {}
+    stack: list = [(schema, root)]
+    # Refs currently being expanded; a bare ref string on the stack marks
+    # where its subtree ends, so membership means "on the current path"
+    active_refs: set = set()
 
-def extract_response_info(spec: Dict[str, Any], operation: Dict[str, Any]) -> Dict[str, Any]:
+    while stack:
+        item = stack.pop()
+        if item.__class__ is str:
+            active_refs.discard(item)
+            continue
+
+        sch, processed = item
+        # Follow ref chains to the end: alias schemas ($ref pointing at
+        # another $ref) are common in generated specs. One marker per hop
+        # keeps the cycle guard exact for alias loops too.
+        ref = sch.get("$ref")
+        while ref is not None:
+            if ref in active_refs:
+                raise ValueError(f"Cyclic $ref in schema: {ref}")
+            active_refs.add(ref)
+            stack.append(ref)
+            sch = resolve(ref)
+            ref = sch.get("$ref")
+
+        # Type goes first (as before) and is swapped for its interned twin
+        node_type = sch.get("type")
+        if node_type is not None:
+            processed["type"] = _TYPES.get(node_type, node_type)
+
+        # Copy scalar keys (description/format/enum/constraints) with one
+        # dict probe each; the sentinel keeps falsy values like 0 intact
+        for key in _SCHEMA_COPY_KEYS:
+            value = sch.get(key, _MISSING)
+            if value is not _MISSING:
+                processed[key] = value
+
+        # Handle array items: attach the child dict now, fill it from the stack
+        if node_type == "array" and "items" in sch:
+            child: Dict[str, Any] = {}
+            processed["items"] = child
+            stack.append((sch["items"], child))
+
+        # Handle object properties
+        if node_type == "object" and "properties" in sch:
+            processed["properties"] = {}
+            for prop_name, prop_schema in sch["properties"].items():
+                child = {}
+                # Interned property names dedupe across the many operations
+                # that share the same parameter and field names
+                processed["properties"][sys.intern(prop_name)] = child
+                stack.append((prop_schema, child))
+
+    return root
+
+
+def extract_response_info(resolve, operation: Dict[str, Any]) -> Dict[str, Any]:
     """Extract response information from operation"""
     responses = operation.get("responses", {})
     response_info = {}
@@ -98,15 +359,16 @@ def extract_response_info(spec: Dict[str, Any], operation: Dict[str, Any]) -> Di
                 json_content = content["application/json"]
                 if "schema" in json_content:
                     schema = json_content["schema"]
-                    response_info[status_code]["schema"] = process_schema_properties(spec, schema)
+                    response_info[status_code]["schema"] = process_schema_properties(resolve, schema)
     
     return response_info
 
 
-def extract_tools_from_openapi(spec: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+def extract_tools_from_openapi(spec: Dict[str, Any]) -> Dict[str, ToolSpec]:
     """Extract tools from OpenAPI spec with enhanced parameter and response documentation"""
     tools = {}
     paths = spec.get("paths", {})
+    resolve = build_ref_resolver(spec)
     
     for path, methods in paths.items():
         for method, operation in methods.items():
@@ -117,20 +379,22 @@ def extract_tools_from_openapi(spec: Dict[str, Any]) -> Dict[str, Dict[str, Any]
                 continue
 
             # Generate tool name
-            name = operation.get("operationId") or f"{method_lower}_{path.strip('/').replace('/', '_').replace('{', '').replace('}', '')}"
+            name = operation.get("operationId") or f"{method_lower}_{path.strip('/').translate(_NAME_TRANS)}"
             name = name.replace(" ", "_")
 
             # Process parameters
             parameters = operation.get("parameters", [])
             props = {}
             required_params = []
-            
+            # Set twin of required_params so membership checks stay O(1)
+            required_seen = set()
+
             for param in parameters:
                 pname = param.get("name")
                 pschema = param.get("schema", {})
                 
                 # Process the parameter schema with full details
-                param_info = process_schema_properties(spec, pschema)
+                param_info = process_schema_properties(resolve, pschema)
                 
                 # Add parameter-specific information
                 param_info["in"] = param.get("in")  # query, path, header, etc.
@@ -143,6 +407,7 @@ def extract_tools_from_openapi(spec: Dict[str, Any]) -> Dict[str, Dict[str, Any]
                 
                 if param.get("required", False):
                     required_params.append(pname)
+                    required_seen.add(pname)
 
             # Add POST/PUT/PATCH requestBody schema props if JSON object
             if method_upper in ("POST", "PUT", "PATCH") and "requestBody" in operation:
@@ -152,17 +417,19 @@ def extract_tools_from_openapi(spec: Dict[str, Any]) -> Dict[str, Dict[str, Any]
                 
                 if json_schema.get("type") == "object":
                     body_props = json_schema.get("properties", {})
-                    for pname, pschema in body_props.items():
-                        if pname not in props:
-                            processed_prop = process_schema_properties(spec, pschema)
-                            props[pname] = processed_prop
-                    
+                    props |= {
+                        pname: process_schema_properties(resolve, pschema)
+                        for pname, pschema in body_props.items()
+                        if pname not in props
+                    }
+
                     # Add required fields from request body
                     body_required = json_schema.get("required", [])
-                    required_params.extend([req for req in body_required if req not in required_params])
+                    required_params.extend(req for req in body_required if req not in required_seen)
+                    required_seen.update(body_required)
 
             # Extract response information
-            response_info = extract_response_info(spec, operation)
+            response_info = extract_response_info(resolve, operation)
 
             # Build comprehensive tool description
             base_description = operation.get("description", "")
@@ -182,7 +449,7 @@ def extract_tools_from_openapi(spec: Dict[str, Any]) -> Dict[str, Dict[str, Any]
                     param_desc = f"- {param_name}"
                     if param_info.get("description"):
                         param_desc += f": {param_info['description']}"
-                    if param_name in required_params:
+                    if param_name in required_seen:
                         param_desc += " (required)"
                     param_descriptions.append(param_desc)
                 
@@ -190,27 +457,21 @@ def extract_tools_from_openapi(spec: Dict[str, Any]) -> Dict[str, Dict[str, Any]
                     full_description.append("\nParameters:")
                     full_description.extend(param_descriptions)
 
-            tool_info = {
-                "name": name,
-                "description": "\n".join(full_description) if full_description else f"{method_upper} {path}",
-                "endpoint": path,
-                "method": method_upper,
-                "inputSchema": {
+            tools[name] = ToolSpec(
+                name=name,
+                description="\n".join(full_description) if full_description else f"{method_upper} {path}",
+                endpoint=path,
+                path_params=frozenset(_PATH_PARAM_RE.findall(path)),
+                url_template=_API_BASE + path,
+                method=method_upper,
+                input_schema={
                     "type": "object",
                     "properties": props,
                     "required": required_params,
                 },
-                "responses": response_info
-            }
-            
-            # Add tags if available
-            if "tags" in operation:
-                tool_info["tags"] = operation["tags"]
-            
-            # Add security requirements if available
-            if "security" in operation:
-                tool_info["security"] = operation["security"]
-            
-            tools[name] = tool_info
-    
+                responses=response_info,
+                tags=tuple(operation.get("tags", ())),
+                security=tuple(operation.get("security", ())),
+            )
+
     return tools
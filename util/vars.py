@@ -1,11 +1,13 @@
 from dotenv import load_dotenv
 import os
+import sys
 
 # --- Environment ---
 load_dotenv()
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
 OPENAPI_JSON = os.getenv("OPENAPI_JSON", ".well-known/openapi.json")
-OPENAPI_SPEC_URL = f"{API_BASE_URL}/{OPENAPI_JSON}"
+# Interned so the hot URI comparison in read_resource can hit on identity
+OPENAPI_SPEC_URL = sys.intern(f"{API_BASE_URL}/{OPENAPI_JSON}")
 
 MCP_SERVER_API_TOKEN = os.getenv("MCP_SERVER_API_TOKEN", "")
 API_TOKEN_PREFIX = os.getenv("API_TOKEN_PREFIX", "")
@@ -14,3 +16,6 @@ AUTH_HEADER = {AUTH_HEADER_NAME: f"{API_TOKEN_PREFIX} {MCP_SERVER_API_TOKEN}".st
 
 MCP_SERVER_NAME = os.getenv("SERVER_TITLE", "My MCP Server")
 HTTP_MCP_SERVER_PORT = int(os.getenv("HTTP_MCP_SERVER_PORT", "9000"))
+
+# Re-fetch the OpenAPI spec every N seconds in the HTTP server (0 = never)
+SPEC_REFRESH_SECS = int(os.getenv("SPEC_REFRESH_SECS", "0"))